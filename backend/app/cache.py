@@ -0,0 +1,72 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+GZIP_MIN_SIZE = 500
+
+
+class ResponseCache:
+    """
+    Small LRU of serialised read-API responses, cleared wholesale on any write.
+
+    The generation counter stops a response built from pre-write data from being
+    stored after the write has already invalidated the cache.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+def build_entry(body):
+    """Precompute the ETag and gzip encoding of a response body once per cache fill."""
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    gzip_body = gzip.compress(body, mtime=0) if len(body) >= GZIP_MIN_SIZE else None
+    return {
+        "body": body,
+        "etag": f'"{digest}"',
+        "gzip_body": gzip_body,
+        # a different representation needs a different strong validator
+        "gzip_etag": f'"{digest}-gzip"',
+    }
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def accepts_gzip(accept_encoding):
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
@@ -9,6 +9,25 @@ class Settings(BaseSettings):
     smtp_email: str
     smtp_password: str
     github_token: str
+
+    # outbound dependency limits (seconds / concurrent calls)
+    gemini_timeout: float = 60
+    gemini_max_concurrent: int = 4
+    github_timeout: float = 15
+    github_max_concurrent: int = 8
+    smtp_timeout: float = 20
+    smtp_max_concurrent: int = 2
+    breaker_failure_threshold: int = 5
+    breaker_reset_seconds: float = 60
+    deferred_retry_seconds: int = 5 * 60
+
+    # scan retention: keep everything for retention_days, then only tagged/changed scans
+    retention_days: int = 30
+    retention_keep_tagged: bool = True  # keep the first scan of each new tag
+    retention_archive: bool = True  # gzip expired rows under archive_path instead of just deleting
+    archive_path: Path = Path("./data/archive")
+    retention_interval_seconds: int = 6 * 60 * 60
+    db_maintenance_interval_seconds: int = 24 * 60 * 60
     
     class Config:
         env_file = os.path.join(os.path.dirname(__file__), '..', '.env')
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
@@ -9,6 +9,22 @@ Base = declarative_base()
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+
+def upgrade_schema():
+    """create_all never alters existing tables, so add columns and indexes introduced after the table was created."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
 
 def get_db():
     db = SessionLocal()
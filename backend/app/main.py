@@ -1,13 +1,26 @@
-from fastapi import FastAPI, Depends, HTTPException, Request,Query
+from fastapi import FastAPI, Depends, HTTPException, Request,Query, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import json
+import html
+import socket
+import threading
 import traceback
+from datetime import datetime, timedelta
 from pathlib import Path
-from database import get_db, init_db
-from models import Repository, PullRequest, ScanDetails,Subscription
+from database import get_db, init_db, SessionLocal
+from models import Repository, PullRequest, ScanDetails,Subscription, PendingNotification, scan_content_hash
+from scheduler import Scheduler
+from resilience import Dependency, DependencyUnavailable, DependencyFailure
+from google.api_core import exceptions as google_exceptions
+from retention import compact_scans, maintain_database
+from cache import ResponseCache, build_entry, etag_matches, accepts_gzip
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -33,6 +46,70 @@ SMTP_PASSWORD = settings.smtp_password
 GEMINI_API_KEY = settings.gemini_api_key
 GITHUB_TOKEN = settings.github_token
 
+IMMEDIATE = "immediate"
+DIGEST_INTERVALS = {"hourly": 60 * 60, "daily": 24 * 60 * 60}
+DELIVERY_MODES = (IMMEDIATE, *DIGEST_INTERVALS)
+# How often queued digests are checked against DIGEST_INTERVALS
+DIGEST_CHECK_SECONDS = 60
+
+# Striped locks serialising lookup + insert of identical scans within this process
+INGEST_LOCKS = [threading.Lock() for _ in range(64)]
+# Scan id -> Event set once store_scan has stored (or given up on) that scan's report
+REPORT_EVENTS = {}
+REPORT_EVENTS_LOCK = threading.Lock()
+REPORT_WAIT_SECONDS = settings.gemini_timeout + 3 * settings.github_timeout
+
+# detect_changes result when a call failed transiently; the work is queued and retried
+LLM_ERROR_PREFIX = "Gemini LLM error"
+# detect_changes result when no call was made (open circuit, full bulkhead); retried without counting an attempt
+UNAVAILABLE_PREFIX = "Dependency unavailable"
+# detect_changes result for failures a retry cannot fix (missing commit, bad repo url, 4xx)
+COMPARISON_ERROR_PREFIX = "Comparison failed"
+TRANSIENT_ERRORS = (
+    DependencyUnavailable,
+    DependencyFailure,
+    requests.Timeout,
+    requests.ConnectionError,
+    TimeoutError,
+    ConnectionError,
+    google_exceptions.ServerError,
+    google_exceptions.TooManyRequests,
+)
+SMTP_TRANSIENT_ERRORS = (
+    smtplib.SMTPServerDisconnected,
+    smtplib.SMTPConnectError,
+    TimeoutError,
+    ConnectionError,
+    socket.gaierror,
+)
+# Queued notifications are dropped after this many failed delivery attempts, or once this old
+MAX_DELIVERY_ATTEMPTS = 12
+MAX_PENDING_AGE = timedelta(days=3)
+# Failed items wait base * 2^(attempts - 1), capped, before the next attempt
+RETRY_BACKOFF_BASE = timedelta(minutes=5)
+RETRY_BACKOFF_MAX = timedelta(hours=6)
+
+# Outbound dependencies, each with its own timeout, circuit breaker and bulkhead
+GEMINI = Dependency(
+    "gemini", settings.gemini_timeout, settings.gemini_max_concurrent,
+    settings.breaker_failure_threshold, settings.breaker_reset_seconds,
+    failure_types=TRANSIENT_ERRORS
+)
+GITHUB = Dependency(
+    "github", settings.github_timeout, settings.github_max_concurrent,
+    settings.breaker_failure_threshold, settings.breaker_reset_seconds,
+    failure_types=TRANSIENT_ERRORS
+)
+SMTP = Dependency(
+    "smtp", settings.smtp_timeout, settings.smtp_max_concurrent,
+    settings.breaker_failure_threshold, settings.breaker_reset_seconds,
+    failure_types=SMTP_TRANSIENT_ERRORS
+)
+DEPENDENCIES = (GEMINI, GITHUB, SMTP)
+
+# Serialised read-API responses; cleared by every write to scans or subscriptions
+response_cache = ResponseCache()
+
 app = FastAPI(title="Impact Analyzer API")
 
 # CORS
@@ -43,10 +120,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+scheduler = Scheduler()
+
 # Initialize DB
 @app.on_event("startup")
 def startup():
     init_db()
+    scheduler.add_job("due-digests", DIGEST_CHECK_SECONDS, run_due_digests, run_at_start=True)
+    scheduler.add_job(
+        "deferred-retry", settings.deferred_retry_seconds, lambda: run_digest_job(IMMEDIATE), run_at_start=True
+    )
+    scheduler.add_job("scan-retention", settings.retention_interval_seconds, run_retention_job, run_at_start=True)
+    # VACUUM rewrites the whole file and blocks writers, so never run it right after a deploy
+    scheduler.add_job("db-maintenance", settings.db_maintenance_interval_seconds, maintain_database)
+    scheduler.start()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    scheduler.stop()
 
 
 class OnboardRequest(BaseModel):
@@ -69,15 +161,15 @@ class SubscribeRequest(BaseModel):
     name:str
     mail:str
     endpoints:List[str]
+    delivery_mode:str = IMMEDIATE
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
+    dependencies = {dep.name: dep.status() for dep in DEPENDENCIES}
+    degraded = any(dep["state"] != "closed" for dep in dependencies.values())
+    return {"status": "degraded" if degraded else "ok", "dependencies": dependencies}
 
 def send_email(to, subject, html_body):
-    server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-    server.login(SMTP_EMAIL, SMTP_PASSWORD)
-
     msg = MIMEMultipart("alternative")
     msg["From"] = SMTP_EMAIL
     msg["To"] = to
@@ -86,8 +178,12 @@ def send_email(to, subject, html_body):
     html_part = MIMEText(html_body, "html", "utf-8")
     msg.attach(html_part)
 
-    server.sendmail(SMTP_EMAIL, to, msg.as_string())
-    server.quit()
+    def deliver():
+        with smtplib.SMTP_SSL("smtp.gmail.com", 465, timeout=SMTP.timeout) as server:
+            server.login(SMTP_EMAIL, SMTP_PASSWORD)
+            server.sendmail(SMTP_EMAIL, to, msg.as_string())
+
+    SMTP.call(deliver)
 
 
 # helpers
@@ -114,6 +210,87 @@ def diff_endpoints(old_scan, new_scan):
 
 
 
+def ingest_lock(name, commit, content_hash):
+    return INGEST_LOCKS[hash((name, commit, content_hash)) % len(INGEST_LOCKS)]
+
+
+def start_report(scan_id):
+    with REPORT_EVENTS_LOCK:
+        REPORT_EVENTS[scan_id] = threading.Event()
+
+
+def finish_report(scan_id):
+    with REPORT_EVENTS_LOCK:
+        event = REPORT_EVENTS.pop(scan_id, None)
+    if event:
+        event.set()
+
+
+def wait_for_report(db, scan):
+    """Let a concurrent duplicate wait for the first request's report, up to the outbound timeouts."""
+    with REPORT_EVENTS_LOCK:
+        event = REPORT_EVENTS.get(scan.id)
+    if event and event.wait(REPORT_WAIT_SECONDS):
+        db.refresh(scan)
+
+
+def find_duplicate_scan(db, name, commit, content_hash, idempotency_key=None):
+    """Return a stored scan matching the Idempotency-Key or (name, commit, content hash)."""
+    if idempotency_key:
+        scan = db.query(ScanDetails).filter(ScanDetails.idempotency_key == idempotency_key).first()
+        if scan:
+            if (scan.name, scan.commit, scan.content_hash) != (name, commit, content_hash):
+                raise HTTPException(
+                    status_code=409,
+                    detail="Idempotency-Key was already used for a different scan"
+                )
+            return scan
+
+    return (
+        db.query(ScanDetails)
+        .filter(ScanDetails.name == name)
+        .filter(ScanDetails.commit == commit)
+        .filter(ScanDetails.content_hash == content_hash)
+        .first()
+    )
+
+
+def report_status(db, scan):
+    """
+    Why a scan does or does not have a report yet.
+
+    stored: the comparison ran. pending: store_scan is still comparing.
+    deferred: a digest or the retry job will compare it. not_computed: nobody
+    needed a comparison (first scan, or no immediate subscribers).
+    """
+    if scan.report:
+        return "stored"
+    with REPORT_EVENTS_LOCK:
+        if scan.id in REPORT_EVENTS:
+            return "pending"
+    queued = (
+        db.query(PendingNotification)
+        .filter(PendingNotification.head_scan_id == scan.id)
+        .filter(PendingNotification.sent_at.is_(None))
+        .first()
+    )
+    return "deferred" if queued else "not_computed"
+
+
+def duplicate_response(db, scan):
+    return {
+        "status": "duplicate",
+        "scan": {
+            "id": scan.id,
+            "commit": scan.commit,
+            "tag_name": scan.tag_name,
+            "created_at": scan.created_at
+        },
+        "report": scan.report,
+        "report_status": report_status(db, scan)
+    }
+
+
 def parse_repo_url(repo_url):
     path = urlparse(repo_url).path.strip("/")
     owner, repo = path.split("/", 1)
@@ -125,6 +302,21 @@ def parse_repo_url(repo_url):
     return owner, repo
 
 
+def github_get(url, headers):
+    """GET against the GitHub API through the GitHub breaker; 5xx and rate limits count as dependency failures."""
+    def fetch():
+        r = requests.get(url, headers=headers, timeout=GITHUB.timeout)
+        if r.status_code >= 500:
+            raise DependencyFailure(f"GitHub API error {r.status_code}")
+        if r.status_code == 429 or (
+            r.status_code == 403 and r.headers.get("X-RateLimit-Remaining") == "0"
+        ):
+            raise DependencyFailure(f"GitHub API rate limited ({r.status_code})")
+        return r
+
+    return GITHUB.call(fetch)
+
+
 def getDiff(old_scan, new_scan):
     owner, repo = parse_repo_url(old_scan.repo_url)
     base = old_scan.commit
@@ -139,7 +331,7 @@ def getDiff(old_scan, new_scan):
     # sanity check first
     for sha in [base, head]:
         commit_check = f"https://api.github.com/repos/{owner}/{repo}/commits/{sha}"
-        r = requests.get(commit_check, headers={
+        r = github_get(commit_check, headers={
             "Authorization": f"Bearer {GITHUB_TOKEN}"
         })
         print("Check commit:", sha, r.status_code)
@@ -153,7 +345,7 @@ def getDiff(old_scan, new_scan):
         "Authorization": f"Bearer {GITHUB_TOKEN}"
     }
 
-    response = requests.get(url, headers=headers)
+    response = github_get(url, headers=headers)
 
     if response.status_code != 200:
         raise Exception(f"GitHub API error {response.status_code}: {response.text}")
@@ -196,21 +388,47 @@ def detect_changes(old_scan, new_scan, user_prompt: str, api_key: str) -> str:
             f"{json.dumps(payload, indent=2)}"
         )
 
-        response = model.generate_content(llm_prompt)
+        response = GEMINI.call(
+            model.generate_content, llm_prompt, request_options={"timeout": GEMINI.timeout}
+        )
         print(response.text)
         return response.text
 
+    except DependencyUnavailable as e:
+        return f"{UNAVAILABLE_PREFIX}: {e}"
+    except TRANSIENT_ERRORS as e:
+        return f"{LLM_ERROR_PREFIX}: {e}"
     except Exception as e:
-        return f"Gemini LLM error: {e}"
+        return f"{COMPARISON_ERROR_PREFIX}: {e}"
+
+
+def is_retryable(llm_response):
+    return llm_response.startswith((LLM_ERROR_PREFIX, UNAVAILABLE_PREFIX))
+
+
+def split_llm_response(llm_response):
+    """Split '<true|false> <html>' into (changed, html_body)."""
+    first_space = llm_response.find(" ")
+    flag_text = llm_response[:first_space]
+    html_body = llm_response[first_space+1:]
+
+    changed_bool = flag_text.strip().lower().startswith("true")
+    return changed_bool, html_body
+
+
+def is_immediate(sub):
+    return (sub.delivery_mode or IMMEDIATE) == IMMEDIATE
 
 
 def notify_subscribers(db, repo_name, llm_response):
+    """Email immediate subscribers; returns the subscriptions that could not be reached."""
     print("notify_subscribers called for:", repo_name)
 
     subs = db.query(Subscription).filter(Subscription.project_name == repo_name).all()
+    subs = [sub for sub in subs if is_immediate(sub)]
     print("subs:", subs)
 
-
+    failed = []
 
     for sub in subs:
         try:
@@ -225,65 +443,343 @@ def notify_subscribers(db, repo_name, llm_response):
 
         except Exception as e:
             print("EMAIL FAILED:", e)
+            failed.append(sub)
+
+    return failed
+
+
+# digests
+
+def queue_digest_notifications(db, subs, previous_scan, new_scan):
+    """
+    Record a scan-to-scan change for each subscriber; delivered later by run_digests.
+
+    Used for digest subscribers, and for immediate subscribers whose notification
+    could not be sent because Gemini, GitHub or SMTP was unavailable.
+    """
+    endpoints = diff_endpoints(json.loads(previous_scan.data or "[]"), json.loads(new_scan.data or "[]"))
+
+    for sub in subs:
+        db.add(PendingNotification(
+            subscription_id=sub.id,
+            project_name=sub.project_name,
+            email=sub.email,
+            base_scan_id=previous_scan.id,
+            head_scan_id=new_scan.id,
+            endpoints=json.dumps(endpoints)
+        ))
+    db.commit()
+
+
+def run_digests(db, mode, min_age=None):
+    """
+    Send one email per subscriber covering every change queued since their last digest.
+
+    With `min_age`, a subscriber is only included once their oldest queued change
+    is at least that old, so digest timing comes from the database rather than
+    from how long this process has been running.
+
+    Queued changes for a project are collapsed into a single base...head comparison,
+    so the LLM runs once per project window (shared by subscribers with the same
+    window) instead of once per scan. Running it for the immediate mode retries
+    deferred notifications. Returns the number of emails sent.
+    """
+    query = db.query(Subscription)
+    if mode == IMMEDIATE:
+        query = query.filter(or_(Subscription.delivery_mode == IMMEDIATE, Subscription.delivery_mode.is_(None)))
+    else:
+        query = query.filter(Subscription.delivery_mode == mode)
+    sub_ids = [sub.id for sub in query.all()]
+    if not sub_ids:
+        return 0
+
+    now = datetime.utcnow()
+    pending = (
+        db.query(PendingNotification)
+        .filter(PendingNotification.sent_at.is_(None))
+        .filter(PendingNotification.subscription_id.in_(sub_ids))
+        .filter(or_(
+            PendingNotification.next_attempt_at.is_(None),
+            PendingNotification.next_attempt_at <= now
+        ))
+        .order_by(PendingNotification.id)
+        .all()
+    )
+
+    by_email = {}
+    for item in pending:
+        by_email.setdefault(item.email, {}).setdefault(item.project_name, []).append(item)
+
+    summaries = {}
+    sent = 0
+    for email, projects in by_email.items():
+        if min_age is not None:
+            oldest = min(item.created_at for items in projects.values() for item in items)
+            if oldest > now - min_age:
+                continue
+
+        sections = []
+        unchanged = []
+        contributed = []
+        for project_name, items in projects.items():
+            base_id = min(item.base_scan_id for item in items)
+            head_id = max(item.head_scan_id for item in items)
+
+            if (base_id, head_id) not in summaries:
+                base_scan = db.get(ScanDetails, base_id)
+                head_scan = db.get(ScanDetails, head_id)
+                single_pair = len({(item.base_scan_id, item.head_scan_id) for item in items}) == 1
+                if not (base_scan and head_scan):
+                    summaries[(base_id, head_id)] = "false "
+                elif single_pair and head_scan.report:
+                    # store_scan already compared exactly this pair
+                    summaries[(base_id, head_id)] = head_scan.report
+                else:
+                    summaries[(base_id, head_id)] = detect_changes(base_scan, head_scan, CUSTOM_PROMPT, GEMINI_API_KEY)
+                    if single_pair and not is_retryable(summaries[(base_id, head_id)]):
+                        # exactly the comparison store_scan skipped; keep it for duplicate posts
+                        head_scan.report = summaries[(base_id, head_id)]
+            llm_response = summaries[(base_id, head_id)]
+
+            if is_retryable(llm_response):
+                # leave queued so the next run retries
+                record_failed_attempt(
+                    items, llm_response, counted=not llm_response.startswith(UNAVAILABLE_PREFIX)
+                )
+                continue
+
+            changed_bool, html_body = split_llm_response(llm_response)
+            if not changed_bool:
+                unchanged.extend(items)
+                continue
+            contributed.extend(items)
+
+            endpoints = sorted({ep for item in items for ep in json.loads(item.endpoints or "[]")})
+            section = f"<h2>{html.escape(project_name)}</h2>"
+            if endpoints:
+                section += "<ul>" + "".join(f"<li>{html.escape(ep)}</li>" for ep in endpoints) + "</ul>"
+            sections.append(section + html_body)
+
+        for item in unchanged:
+            item.sent_at = now
+
+        if sections:
+            try:
+                send_email(
+                    to=email,
+                    subject=(
+                        "Impact Analyzer: changes detected" if mode == IMMEDIATE
+                        else f"Impact Analyzer {mode} digest"
+                    ),
+                    html_body="".join(sections)
+                )
+                sent += 1
+                print("Digest sent to:", email)
+            except Exception as e:
+                print("DIGEST EMAIL FAILED:", e)
+                record_failed_attempt(contributed, e, counted=not isinstance(e, DependencyUnavailable))
+                continue
+
+        for item in contributed:
+            item.sent_at = now
+
+    db.commit()
+    return sent
+
+
+def record_failed_attempt(items, error, counted=True):
+    """
+    Schedule the next try for items whose delivery failed.
+
+    A fast failure from an open circuit or full bulkhead made no call, so it is
+    not counted; items are still dropped once they are older than MAX_PENDING_AGE.
+    """
+    now = datetime.utcnow()
+    for item in items:
+        if counted:
+            item.attempts = (item.attempts or 0) + 1
+        too_old = item.created_at is not None and item.created_at < now - MAX_PENDING_AGE
+        if too_old or (item.attempts or 0) >= MAX_DELIVERY_ATTEMPTS:
+            print(f"Giving up on notification {item.id} for {item.email}: {error}")
+            item.sent_at = now
+        else:
+            item.next_attempt_at = now + min(
+                RETRY_BACKOFF_BASE * 2 ** max((item.attempts or 0) - 1, 0), RETRY_BACKOFF_MAX
+            )
+
+
+def run_digest_job(mode, min_age=None):
+    db = SessionLocal()
+    try:
+        run_digests(db, mode, min_age)
+    finally:
+        db.close()
+
+
+def run_due_digests():
+    for mode, interval in DIGEST_INTERVALS.items():
+        run_digest_job(mode, timedelta(seconds=interval))
+
+
+def run_retention_job():
+    db = SessionLocal()
+    try:
+        removed = compact_scans(
+            db,
+            settings.retention_days,
+            keep_tagged=settings.retention_keep_tagged,
+            archive_path=settings.archive_path if settings.retention_archive else None
+        )
+        if removed:
+            response_cache.invalidate()
+    finally:
+        db.close()
+
+
+# response cache
+
+def cached_response(request):
+    """Look up the response for this route + query; returns (key, generation, response or None)."""
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    generation = response_cache.generation
+    entry = response_cache.get(key)
+    if entry is None:
+        return key, generation, None
+    return key, generation, entry_response(request, entry)
+
+
+def cache_and_respond(request, key, generation, payload):
+    body = json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+    entry = build_entry(body)
+    response_cache.put(key, entry, generation)
+    return entry_response(request, entry)
+
+
+def entry_response(request, entry):
+    use_gzip = entry["gzip_body"] is not None and accepts_gzip(request.headers.get("accept-encoding"))
+    etag = entry["gzip_etag"] if use_gzip else entry["etag"]
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(entry["gzip_body"], media_type="application/json", headers=headers)
+    return Response(entry["body"], media_type="application/json", headers=headers)
 
 
 # api routes
 
 @app.post("/api/scan")
-def store_scan(request: ScanRequest, db: Session = Depends(get_db)):
+def store_scan(
+    request: ScanRequest,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     try:
         repo_url = request.repo_url or ""
         name = repo_url.rstrip("/").split("/")[-1]
         if name.endswith(".git"):
             name = name[:-4]
 
-        # ---- Fetch previous scan ----
-        previous_scan = (
-            db.query(ScanDetails)
-            .filter(ScanDetails.name == name)
-            .order_by(ScanDetails.created_at.desc())
-            .first()
-        )
+        content_hash = scan_content_hash(request.data)
+
+        # ---- Held only while looking up / inserting, never across outbound calls ----
+        with ingest_lock(name, request.commit, content_hash):
+            # ---- Short-circuit re-runs for the same commit and data ----
+            duplicate = find_duplicate_scan(db, name, request.commit, content_hash, idempotency_key)
+
+            if not duplicate:
+                # ---- Fetch previous scan ----
+                previous_scan = (
+                    db.query(ScanDetails)
+                    .filter(ScanDetails.name == name)
+                    .order_by(ScanDetails.created_at.desc())
+                    .first()
+                )
+
+                # ---- Save new scan ----
+                scan_details = ScanDetails(
+                    repo_url=request.repo_url,
+                    commit=request.commit,
+                    name=name,
+                    tag_name=request.tag_name,
+                    data=json.dumps(request.data),
+                    content_hash=content_hash,
+                    idempotency_key=idempotency_key
+                )
+                print(scan_details.repo_url, scan_details.commit, scan_details.name, scan_details.tag_name, scan_details.data)
+                db.add(scan_details)
+                try:
+                    db.commit()
+                    start_report(scan_details.id)
+                except IntegrityError:
+                    # another worker stored the same scan between our lookup and insert
+                    db.rollback()
+                    duplicate = find_duplicate_scan(db, name, request.commit, content_hash, idempotency_key)
+                    if not duplicate:
+                        raise
+
+        if duplicate:
+            print("Duplicate scan, returning stored report:", duplicate.id)
+            wait_for_report(db, duplicate)
+            return duplicate_response(db, duplicate)
 
-        # ---- Save new scan ----
-        scan_details = ScanDetails(
-            repo_url=request.repo_url,
-            commit=request.commit,
-            name=name,
-            tag_name=request.tag_name,
-            data=json.dumps(request.data)
-        )
-        print(scan_details.repo_url, scan_details.commit, scan_details.name, scan_details.tag_name, scan_details.data)
-        db.add(scan_details)
-        db.commit()
+        try:
+            response_cache.invalidate()
 
-        response = {"message": "Scan stored. No previous scan to compare."}
+            response = {"message": "Scan stored. No previous scan to compare."}
 
-        # ---- Compare with previous & detect changes ----
-        if previous_scan:
-            old_data = json.loads(previous_scan.data)
-            new_data = request.data
+            # ---- Compare with previous & detect changes ----
+            if previous_scan:
+                subs = db.query(Subscription).filter(Subscription.project_name == name).all()
+                digest_subs = [sub for sub in subs if not is_immediate(sub)]
 
-            llm_response = detect_changes(previous_scan, scan_details, CUSTOM_PROMPT, GEMINI_API_KEY)
+                # ---- Digest subscribers are summarised later by run_digests ----
+                if digest_subs:
+                    queue_digest_notifications(db, digest_subs, previous_scan, scan_details)
 
-            first_space = llm_response.find(" ")
-            flag_text = llm_response[:first_space]
-            html_body = llm_response[first_space+1:]
+                if len(digest_subs) == len(subs):
+                    return "ok"
 
-            changed_bool = flag_text.strip().lower().startswith("true")
+                immediate_subs = [sub for sub in subs if is_immediate(sub)]
 
-            response = llm_response
+                llm_response = detect_changes(previous_scan, scan_details, CUSTOM_PROMPT, GEMINI_API_KEY)
 
-            if changed_bool:
-                print("There were changes..sending mail")
-                try:
-                    notify_subscribers(db, name, html_body)
-                except Exception as e:
-                    print("Notification error:", e)
-                    response = f"Notification error: {e}"
+                # ---- Dependency down: defer to the retry job instead of dropping the notification ----
+                if is_retryable(llm_response):
+                    print("Deferring notification:", llm_response)
+                    queue_digest_notifications(db, immediate_subs, previous_scan, scan_details)
+                    return "ok"
+
+                scan_details.report = llm_response
+                db.commit()
+                # ---- Duplicates only wait for the report, not for the emails ----
+                finish_report(scan_details.id)
+
+                changed_bool, html_body = split_llm_response(llm_response)
+
+                response = llm_response
+
+                if changed_bool:
+                    print("There were changes..sending mail")
+                    try:
+                        failed = notify_subscribers(db, name, html_body)
+                        if failed:
+                            queue_digest_notifications(db, failed, previous_scan, scan_details)
+                    except Exception as e:
+                        print("Notification error:", e)
+                        response = f"Notification error: {e}"
+        finally:
+            finish_report(scan_details.id)
 
         return "ok" 
 
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(500, f"Scan failed: {str(e)}")
@@ -293,9 +789,14 @@ def store_scan(request: ScanRequest, db: Session = Depends(get_db)):
 
 
 @app.get("/api/projects")
-def get_projects(db: Session = Depends(get_db)):
+def get_projects(request: Request, db: Session = Depends(get_db)):
+    key, generation, cached = cached_response(request)
+    if cached:
+        return cached
+
     try:
-        scans = db.query(ScanDetails).all()
+        # only the two columns needed, not every scan's JSON blob
+        scans = db.query(ScanDetails.name, ScanDetails.repo_url).all()
 
         projects = {}
         for scan in scans:
@@ -304,7 +805,7 @@ def get_projects(db: Session = Depends(get_db)):
 
         result = [{"name": name, "url": url} for name, url in projects.items()]
 
-        return {"projects": result}
+        return cache_and_respond(request, key, generation, {"projects": result})
 
     except Exception as e:
         traceback.print_exc()
@@ -314,7 +815,11 @@ def get_projects(db: Session = Depends(get_db)):
         )
 
 @app.get("/api/projects/{project_name}")
-def get_project_details(project_name: str, db: Session = Depends(get_db)):
+def get_project_details(project_name: str, request: Request, db: Session = Depends(get_db)):
+    key, generation, cached = cached_response(request)
+    if cached:
+        return cached
+
     try:
         scans = (
             db.query(ScanDetails)
@@ -343,7 +848,7 @@ def get_project_details(project_name: str, db: Session = Depends(get_db)):
                 "data": json.loads(scan.data or "[]")
             })
 
-        return result
+        return cache_and_respond(request, key, generation, result)
 
     except HTTPException:
         raise
@@ -357,16 +862,24 @@ def get_project_details(project_name: str, db: Session = Depends(get_db)):
 
 @app.post("/api/subscribe")
 def subscribeEndpoints(request: SubscribeRequest, db: Session = Depends(get_db)):
+    if request.delivery_mode not in DELIVERY_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"delivery_mode must be one of: {', '.join(DELIVERY_MODES)}"
+        )
+
     try:
         sub = Subscription(
             project_name=request.name,
             email=request.mail,
-            endpoints=json.dumps(request.endpoints)
+            endpoints=json.dumps(request.endpoints),
+            delivery_mode=request.delivery_mode
         )
         
         db.add(sub)
         db.commit()
         db.refresh(sub)
+        response_cache.invalidate()
 
         print("Subscription saved:", sub.id)
 
@@ -382,10 +895,15 @@ def subscribeEndpoints(request: SubscribeRequest, db: Session = Depends(get_db))
         
 @app.get("/api/subscriptions")
 def get_subscriptions(
+    request: Request,
     project_name: str = Query(None),
     email: str = Query(None),
     db: Session = Depends(get_db)
 ):
+    key, generation, cached = cached_response(request)
+    if cached:
+        return cached
+
     try:
         query = db.query(Subscription)
 
@@ -403,10 +921,11 @@ def get_subscriptions(
                 "project_name": sub.project_name,
                 "email": sub.email,
                 "endpoints": json.loads(sub.endpoints),
+                "delivery_mode": sub.delivery_mode or IMMEDIATE,
                 "created_at": sub.created_at
             })
 
-        return {"subscriptions": result}
+        return cache_and_respond(request, key, generation, {"subscriptions": result})
 
     except Exception as e:
         traceback.print_exc()
@@ -425,7 +944,10 @@ def test_gemini_connection():
         genai.configure(api_key=GEMINI_API_KEY)
         model = genai.GenerativeModel("gemini-2.0-flash")
 
-        response = model.generate_content("Say 'Gemini connection successful.'")
+        response = GEMINI.call(
+            model.generate_content, "Say 'Gemini connection successful.'",
+            request_options={"timeout": GEMINI.timeout}
+        )
         print("LLM Response:", response.text)
         return {"message": response.text}
 
@@ -1,9 +1,17 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime,ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime,ForeignKey, Index
 from datetime import datetime
 from database import Base
+import hashlib
 import json
 from sqlalchemy.orm import relationship
 
+
+def scan_content_hash(scan_data):
+    """Stable sha256 of the scan payload, independent of key order."""
+    canonical = json.dumps(scan_data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
 class Repository(Base):
     __tablename__ = "repositories"
     
@@ -52,8 +60,16 @@ class ScanDetails(Base):
     commit = Column(String)
     tag_name = Column(String)
     data = Column(Text)  # Store dependency graph as JSON string
+    content_hash = Column(String)  # sha256 of the canonical scan data
+    idempotency_key = Column(String, unique=True, index=True, nullable=True)
+    report = Column(Text)  # LLM response from comparing with the previous scan
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_scan_details_dedupe", "name", "commit", "content_hash", unique=True),
+        Index("ix_scan_details_name_created", "name", "created_at"),
+    )
+
     @property
     def impact(self):
         return json.loads(self.impact_json) if self.impact_json else {}
@@ -69,4 +85,21 @@ class Subscription(Base):
     project_name = Column(String, index=True)
     email = Column(String, index=True)
     endpoints = Column(Text)  # JSON array stored as string
+    delivery_mode = Column(String, default="immediate")  # 'immediate', 'hourly' or 'daily'
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PendingNotification(Base):
+    __tablename__ = "pending_notifications"
+
+    id = Column(Integer, primary_key=True)
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id"), index=True)
+    project_name = Column(String)
+    email = Column(String, index=True)
+    base_scan_id = Column(Integer)  # scan the change was compared against
+    head_scan_id = Column(Integer)  # scan that introduced the change
+    endpoints = Column(Text)  # JSON array of changed endpoints
+    attempts = Column(Integer, default=0)  # failed delivery attempts so far
+    next_attempt_at = Column(DateTime, nullable=True)  # backoff after a failed attempt
     created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
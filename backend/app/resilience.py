@@ -0,0 +1,140 @@
+import threading
+import time
+
+
+class DependencyUnavailable(Exception):
+    """Raised instead of calling a dependency that is known to be down or saturated."""
+
+
+class CircuitOpenError(DependencyUnavailable):
+    pass
+
+
+class BulkheadFullError(DependencyUnavailable):
+    pass
+
+
+class DependencyFailure(Exception):
+    """The dependency answered, but with a server-side error worth retrying later."""
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail fast for `reset_timeout` seconds, then a single trial call is let
+    through; its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=60, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._trial_in_flight = False
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError("circuit open")
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    raise CircuitOpenError("circuit half-open, trial call in flight")
+                self._trial_in_flight = True
+
+    def release_trial(self):
+        """Give back a half-open trial slot that was claimed but never used."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class Dependency:
+    """
+    An outbound dependency with its own timeout, circuit breaker and bulkhead.
+
+    `timeout` is handed to the underlying client by the caller; the bulkhead caps
+    concurrent calls so one slow dependency cannot occupy every worker thread.
+    Callers wait at most `bulkhead_wait` seconds for a free slot, and never when
+    the circuit is already open. Only exceptions in `failure_types` count against
+    the breaker; anything else (a bad prompt, one refused recipient) is the
+    caller's problem and the dependency is treated as healthy.
+    """
+
+    def __init__(self, name, timeout, max_concurrent, failure_threshold=5, reset_timeout=60,
+                 clock=time.monotonic, bulkhead_wait=0.5, failure_types=(Exception,)):
+        self.name = name
+        self.failure_types = failure_types
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent
+        self.bulkhead_wait = bulkhead_wait
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, clock)
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def call(self, func, *args, **kwargs):
+        self.breaker.before_call()
+
+        if not self._slots.acquire(timeout=self.bulkhead_wait):
+            # saturation says nothing about health, so hand a half-open trial back
+            self.breaker.release_trial()
+            raise BulkheadFullError(f"{self.name}: {self.max_concurrent} calls already in flight")
+
+        try:
+            with self._lock:
+                self.in_flight += 1
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if isinstance(e, self.failure_types):
+                    self.breaker.record_failure(e)
+                else:
+                    self.breaker.record_success()
+                raise
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+            self.breaker.record_success()
+            return result
+        finally:
+            self._slots.release()
+
+    def status(self):
+        return {
+            "state": self.breaker.state,
+            "failures": self.breaker.failures,
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "timeout": self.timeout,
+            "last_error": self.breaker.last_error,
+        }
@@ -0,0 +1,145 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import text, case, func
+from database import engine
+from models import ScanDetails, PendingNotification, scan_content_hash
+
+# Rows fetched or deleted per statement when handling expired scans
+BATCH_SIZE = 500
+
+
+def is_changed_report(report):
+    return (report or "").strip().lower().startswith("true")
+
+
+def content_key(scan):
+    """The stored content hash, computed from `data` only for rows stored before hashes existed."""
+    return scan.content_hash or scan_content_hash(json.loads(scan.data or "[]"))
+
+
+def select_expired(scans, cutoff, protected_ids=(), keep_tagged=True):
+    """
+    Given one project's scans oldest-first, return the ones the policy lets go.
+
+    Kept: anything newer than `cutoff`, the latest scan (base of the next
+    comparison), the first scan, scans whose data differs from the scan
+    before them or whose report flagged changes, the first scan of each tag
+    (the analyzer sends a tag with every scan, so only a new tag marks a
+    release), and scans still referenced by queued notifications. Dropped
+    scans are identical to their predecessor, so comparisons between the
+    remaining neighbours give the same result.
+    """
+    expired = []
+    previous_key = None
+    previous_tag = None
+    for i, scan in enumerate(scans):
+        key = content_key(scan)
+        changed = previous_key is None or key != previous_key
+        previous_key = key
+
+        new_tag = bool(scan.tag_name) and scan.tag_name != previous_tag
+        previous_tag = scan.tag_name
+
+        if (
+            scan.created_at is None
+            or scan.created_at >= cutoff
+            or i == len(scans) - 1
+            or changed
+            or is_changed_report(scan.report)
+            or (keep_tagged and new_tag)
+            or scan.id in protected_ids
+        ):
+            continue
+        expired.append(scan)
+    return expired
+
+
+def archive_scans(scans, archive_path, now):
+    """Append the rows to a gzipped JSON lines file per project; returns the file path."""
+    project = scans[0].name or "unknown"
+    project_dir = archive_path / project
+    project_dir.mkdir(parents=True, exist_ok=True)
+    target = project_dir / f"scans-{now:%Y%m%d}.jsonl.gz"
+
+    with gzip.open(target, "at", encoding="utf-8") as f:
+        for scan in scans:
+            f.write(json.dumps({
+                "id": scan.id,
+                "repo_url": scan.repo_url,
+                "name": scan.name,
+                "commit": scan.commit,
+                "tag_name": scan.tag_name,
+                "data": json.loads(scan.data or "[]"),
+                "content_hash": scan.content_hash,
+                "report": scan.report,
+                "created_at": scan.created_at.isoformat() if scan.created_at else None,
+            }) + "\n")
+    return target
+
+
+def compact_scans(db, retention_days, keep_tagged=True, archive_path=None, now=None):
+    """Apply the retention policy to every project; returns the number of scans removed."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=retention_days)
+
+    # scans a queued notification still needs to compare
+    protected_ids = set()
+    for base_id, head_id in (
+        db.query(PendingNotification.base_scan_id, PendingNotification.head_scan_id)
+        .filter(PendingNotification.sent_at.is_(None))
+        .all()
+    ):
+        protected_ids.update((base_id, head_id))
+
+    names = [row.name for row in db.query(ScanDetails.name).distinct().all()]
+
+    removed = 0
+    for name in names:
+        # only what the policy needs: data just for pre-hash rows, and the report's verdict prefix
+        scans = (
+            db.query(
+                ScanDetails.id,
+                ScanDetails.created_at,
+                ScanDetails.tag_name,
+                ScanDetails.content_hash,
+                case((ScanDetails.content_hash.is_(None), ScanDetails.data), else_=None).label("data"),
+                func.substr(ScanDetails.report, 1, 16).label("report"),
+            )
+            .filter(ScanDetails.name == name)
+            .order_by(ScanDetails.created_at, ScanDetails.id)
+            .all()
+        )
+        expired_ids = [scan.id for scan in select_expired(scans, cutoff, protected_ids, keep_tagged)]
+        if not expired_ids:
+            continue
+
+        for start in range(0, len(expired_ids), BATCH_SIZE):
+            batch = expired_ids[start:start + BATCH_SIZE]
+            if archive_path is not None:
+                rows = db.query(ScanDetails).filter(ScanDetails.id.in_(batch)).order_by(ScanDetails.id).all()
+                archive_scans(rows, archive_path, now)
+            db.query(ScanDetails).filter(ScanDetails.id.in_(batch)).delete(synchronize_session=False)
+            db.commit()
+
+        print(f"Retention: removed {len(expired_ids)} scans of {name}")
+        removed += len(expired_ids)
+
+    # delivered notifications are only history
+    (
+        db.query(PendingNotification)
+        .filter(PendingNotification.sent_at.isnot(None))
+        .filter(PendingNotification.sent_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+
+    return removed
+
+
+def maintain_database():
+    """Refresh planner statistics and, on SQLite, reclaim space freed by compaction."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("VACUUM"))
+        conn.execute(text("ANALYZE"))
@@ -0,0 +1,57 @@
+import threading
+import time
+import traceback
+
+
+class Scheduler:
+    """
+    Runs registered jobs from a single daemon thread.
+
+    Jobs added with run_at_start=True first run on the first tick after start,
+    so a restart never postpones them by a full interval; the rest wait one
+    interval before their first run.
+    """
+
+    def __init__(self, tick_seconds=30):
+        self.tick_seconds = tick_seconds
+        self.jobs = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_job(self, name, interval_seconds, func, run_at_start=False):
+        now = time.monotonic()
+        self.jobs.append({
+            "name": name,
+            "interval": interval_seconds,
+            "func": func,
+            "next_run": now if run_at_start else now + interval_seconds,
+        })
+
+    def run_pending(self, now=None):
+        now = time.monotonic() if now is None else now
+        for job in self.jobs:
+            if now < job["next_run"]:
+                continue
+            job["next_run"] = now + job["interval"]
+            try:
+                print("Running scheduled job:", job["name"])
+                job["func"]()
+            except Exception:
+                traceback.print_exc()
+
+    def _loop(self):
+        while not self._stop.wait(self.tick_seconds):
+            self.run_pending()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.main import app, get_db, response_cache, ScanDetails
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Sessionmaker bound to a fresh SQLite file with every table created."""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False}
+    )
+    ScanDetails.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def app_db(session_factory):
+    """Route the API's get_db to the test database, starting from an empty response cache."""
+    def override():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override
+    response_cache.invalidate()
+    yield session_factory
+    app.dependency_overrides.clear()
+    response_cache.invalidate()
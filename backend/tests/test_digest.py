@@ -0,0 +1,189 @@
+import json
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from app.main import (
+    MAX_DELIVERY_ATTEMPTS, MAX_PENDING_AGE, run_digests, run_due_digests, queue_digest_notifications,
+    ScanDetails, Subscription, PendingNotification
+)
+from app.scheduler import Scheduler
+
+
+def add_scan(db, commit, endpoints):
+    scan = ScanDetails(
+        repo_url="https://github.com/a/repo",
+        name="repo",
+        commit=commit,
+        tag_name="v1",
+        data=json.dumps([{"method": "GET", "path": p} for p in endpoints]),
+    )
+    db.add(scan)
+    db.commit()
+    return scan
+
+
+def test_digest_coalesces_scans_into_one_email(db):
+    sub = Subscription(project_name="repo", email="user@example.com", endpoints="[]", delivery_mode="hourly")
+    db.add(sub)
+    db.commit()
+
+    s1 = add_scan(db, "c1", ["/a"])
+    s2 = add_scan(db, "c2", ["/a", "/b"])
+    s3 = add_scan(db, "c3", ["/a", "/b", "/c"])
+    queue_digest_notifications(db, [sub], s1, s2)
+    queue_digest_notifications(db, [sub], s2, s3)
+    queue_digest_notifications(db, [sub], s2, s3)
+
+    with patch("app.main.detect_changes", return_value="true <p>Changed</p>") as mock_llm, \
+            patch("app.main.send_email") as mock_send:
+        assert run_digests(db, "hourly") == 1
+        assert run_digests(db, "hourly") == 0
+
+    mock_llm.assert_called_once()
+    old_scan, new_scan = mock_llm.call_args.args[:2]
+    assert (old_scan.commit, new_scan.commit) == ("c1", "c3")
+
+    body = mock_send.call_args.kwargs["html_body"]
+    assert body.count("GET /c") == 1
+    assert "GET /b" in body
+    assert db.query(PendingNotification).filter(PendingNotification.sent_at.is_(None)).count() == 0
+
+
+def test_digest_keeps_pending_on_llm_error(db):
+    sub = Subscription(project_name="repo", email="user@example.com", endpoints="[]", delivery_mode="daily")
+    db.add(sub)
+    db.commit()
+    queue_digest_notifications(db, [sub], add_scan(db, "c1", ["/a"]), add_scan(db, "c2", ["/b"]))
+
+    with patch("app.main.detect_changes", return_value="Gemini LLM error: down"), \
+            patch("app.main.send_email") as mock_send:
+        assert run_digests(db, "daily") == 0
+
+    mock_send.assert_not_called()
+    assert db.query(PendingNotification).filter(PendingNotification.sent_at.is_(None)).count() == 1
+
+
+def test_deferred_immediate_notification_reuses_stored_report(db):
+    sub = Subscription(project_name="repo", email="user@example.com", endpoints="[]")
+    db.add(sub)
+    db.commit()
+    s1 = add_scan(db, "c1", ["/a"])
+    s2 = add_scan(db, "c2", ["/a", "/b"])
+    s2.report = "true <p>Stored</p>"
+    queue_digest_notifications(db, [sub], s1, s2)
+
+    with patch("app.main.detect_changes") as mock_llm, patch("app.main.send_email") as mock_send:
+        assert run_digests(db, "immediate") == 1
+
+    mock_llm.assert_not_called()
+    assert "<p>Stored</p>" in mock_send.call_args.kwargs["html_body"]
+
+
+def test_digest_waits_for_oldest_item_to_reach_interval(db):
+    sub = Subscription(project_name="repo", email="user@example.com", endpoints="[]", delivery_mode="daily")
+    db.add(sub)
+    db.commit()
+    queue_digest_notifications(db, [sub], add_scan(db, "c1", ["/a"]), add_scan(db, "c2", ["/b"]))
+
+    with patch("app.main.detect_changes", return_value="true <p>Changed</p>"), \
+            patch("app.main.send_email") as mock_send:
+        assert run_digests(db, "daily", min_age=timedelta(days=1)) == 0
+
+        item = db.query(PendingNotification).one()
+        item.created_at = datetime.utcnow() - timedelta(days=1, minutes=1)
+        db.commit()
+        assert run_digests(db, "daily", min_age=timedelta(days=1)) == 1
+
+    mock_send.assert_called_once()
+
+
+def test_failed_send_only_counts_attempts_for_changed_projects(db):
+    sub_a = Subscription(project_name="repo", email="user@example.com", endpoints="[]", delivery_mode="hourly")
+    sub_b = Subscription(project_name="other", email="user@example.com", endpoints="[]", delivery_mode="hourly")
+    db.add_all([sub_a, sub_b])
+    db.commit()
+    s1, s2 = add_scan(db, "c1", ["/a"]), add_scan(db, "c2", ["/b"])
+    queue_digest_notifications(db, [sub_a], s1, s2)
+    s3, s4 = add_scan(db, "c3", ["/a"]), add_scan(db, "c4", ["/a"])
+    queue_digest_notifications(db, [sub_b], s3, s4)
+
+    def llm(old_scan, new_scan, *args):
+        return "true <p>Changed</p>" if new_scan.commit == "c2" else "false <p>Same</p>"
+
+    with patch("app.main.detect_changes", side_effect=llm), \
+            patch("app.main.send_email", side_effect=Exception("smtp down")):
+        assert run_digests(db, "hourly") == 0
+
+    changed = db.query(PendingNotification).filter(PendingNotification.project_name == "repo").one()
+    unchanged = db.query(PendingNotification).filter(PendingNotification.project_name == "other").one()
+    assert (changed.attempts, changed.sent_at) == (1, None)
+    assert unchanged.attempts == 0
+    assert unchanged.sent_at is not None
+
+
+def test_scheduler_runs_only_startup_jobs_on_first_tick():
+    scheduler = Scheduler()
+    calls = []
+    scheduler.add_job("job", 3600, lambda: calls.append("startup"), run_at_start=True)
+    scheduler.add_job("later", 3600, lambda: calls.append("later"))
+
+    scheduler.run_pending()
+    scheduler.run_pending()
+
+    assert calls == ["startup"]
+
+
+def test_due_digest_backs_off_after_failure(db, session_factory):
+    sub = Subscription(project_name="repo", email="user@example.com", endpoints="[]", delivery_mode="daily")
+    db.add(sub)
+    db.commit()
+    queue_digest_notifications(db, [sub], add_scan(db, "c1", ["/a"]), add_scan(db, "c2", ["/b"]))
+    item = db.query(PendingNotification).one()
+    item.created_at = datetime.utcnow() - timedelta(days=2)
+    db.commit()
+
+    with patch("app.main.SessionLocal", session_factory), \
+            patch("app.main.detect_changes", return_value="Gemini LLM error: 503") as mock_llm, \
+            patch("app.main.send_email") as mock_send:
+        for _ in range(20):
+            run_due_digests()
+
+        db.refresh(item)
+        assert mock_llm.call_count == 1
+        assert item.attempts == 1
+        assert item.sent_at is None
+        assert item.next_attempt_at > datetime.utcnow()
+
+        item.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+        mock_llm.return_value = "true <p>Changed</p>"
+        run_due_digests()
+
+    mock_send.assert_called_once()
+    db.refresh(item)
+    assert item.sent_at is not None
+
+
+def test_unavailable_dependency_is_not_counted_but_old_items_expire(db):
+    sub = Subscription(project_name="repo", email="user@example.com", endpoints="[]")
+    db.add(sub)
+    db.commit()
+    queue_digest_notifications(db, [sub], add_scan(db, "c1", ["/a"]), add_scan(db, "c2", ["/b"]))
+    item = db.query(PendingNotification).one()
+
+    with patch("app.main.detect_changes", return_value="Dependency unavailable: circuit open"):
+        for _ in range(MAX_DELIVERY_ATTEMPTS + 1):
+            item.next_attempt_at = None
+            db.commit()
+            run_digests(db, "immediate")
+
+        db.refresh(item)
+        assert item.attempts == 0
+        assert item.sent_at is None
+
+        item.next_attempt_at = None
+        item.created_at = datetime.utcnow() - MAX_PENDING_AGE - timedelta(minutes=1)
+        db.commit()
+        run_digests(db, "immediate")
+
+    db.refresh(item)
+    assert item.sent_at is not None
@@ -6,4 +6,7 @@ client = TestClient(app)
 def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
-    assert response.json() == {"status": "ok"}
+    body = response.json()
+    assert body["status"] == "ok"
+    assert set(body["dependencies"]) == {"gemini", "github", "smtp"}
+    assert body["dependencies"]["gemini"]["state"] == "closed"
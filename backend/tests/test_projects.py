@@ -11,7 +11,7 @@ def fake_db_projects():
             self.repo_url = "https://github.com/a/b"
 
     class DummyDB:
-        def query(self, model):
+        def query(self, *models):
             class Q:
                 def all(self_inner):
                     return [DummyScan()]
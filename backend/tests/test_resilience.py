@@ -0,0 +1,272 @@
+import smtplib
+import threading
+import time
+import pytest
+import requests
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import (
+    app, getDiff, send_email, detect_changes, GEMINI, GITHUB, SMTP,
+    ScanDetails, Subscription, PendingNotification
+)
+from app.resilience import Dependency, CircuitBreaker, CircuitOpenError, BulkheadFullError
+
+client = TestClient(app)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyService:
+    """Local stand-in that fails (or hangs) on demand."""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = True
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        if self.fail:
+            raise requests.Timeout("read timed out")
+        return "ok"
+
+    def hang(self):
+        self.started.set()
+        self.release.wait(5)
+        return "late"
+
+
+@pytest.fixture(autouse=True)
+def reset_breakers():
+    for dep in (GEMINI, GITHUB, SMTP):
+        dep.breaker.reset()
+    yield
+    for dep in (GEMINI, GITHUB, SMTP):
+        dep.breaker.reset()
+
+
+def make_scan(commit):
+    s = ScanDetails()
+    s.commit = commit
+    s.repo_url = "https://github.com/a/b"
+    s.data = "[]"
+    return s
+
+
+def test_breaker_opens_then_recovers():
+    clock = FakeClock()
+    dep = Dependency("fake", timeout=1, max_concurrent=2, failure_threshold=2, reset_timeout=30, clock=clock)
+    service = FlakyService()
+
+    for _ in range(2):
+        with pytest.raises(requests.Timeout):
+            dep.call(service)
+    assert dep.breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        dep.call(service)
+    assert service.calls == 2
+
+    clock.now = 31
+    service.fail = False
+    assert dep.call(service) == "ok"
+    assert dep.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_failure_reopens():
+    clock = FakeClock()
+    dep = Dependency("fake", timeout=1, max_concurrent=2, failure_threshold=1, reset_timeout=30, clock=clock)
+    service = FlakyService()
+
+    with pytest.raises(requests.Timeout):
+        dep.call(service)
+    clock.now = 31
+    with pytest.raises(requests.Timeout):
+        dep.call(service)
+    assert dep.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        dep.call(service)
+
+
+def test_bulkhead_isolates_slow_dependency():
+    slow = Dependency("slow", timeout=0.1, max_concurrent=1)
+    fast = Dependency("fast", timeout=0.1, max_concurrent=1)
+    service = FlakyService()
+
+    worker = threading.Thread(target=slow.call, args=(service.hang,))
+    worker.start()
+    try:
+        assert service.started.wait(5)
+        with pytest.raises(BulkheadFullError):
+            slow.call(lambda: "never")
+        assert fast.call(lambda: "ok") == "ok"
+    finally:
+        service.release.set()
+        worker.join()
+    # saturation is not a failure of the dependency itself
+    assert slow.breaker.state == CircuitBreaker.CLOSED
+
+
+@patch("app.main.requests.get", side_effect=requests.ConnectionError("down"))
+def test_github_breaker_fails_fast(mock_get):
+    for _ in range(GITHUB.breaker.failure_threshold):
+        with pytest.raises(requests.ConnectionError):
+            getDiff(make_scan("a"), make_scan("b"))
+    assert mock_get.call_args.kwargs["timeout"] == GITHUB.timeout
+
+    with pytest.raises(Exception, match="circuit open"):
+        getDiff(make_scan("a"), make_scan("b"))
+    assert mock_get.call_count == GITHUB.breaker.failure_threshold
+
+    health = client.get("/health").json()
+    assert health["status"] == "degraded"
+    assert health["dependencies"]["github"]["state"] == "open"
+    assert health["dependencies"]["gemini"]["state"] == "closed"
+
+
+@patch("app.main.genai.GenerativeModel")
+@patch("app.main.getDiff", return_value="diff")
+def test_gemini_open_circuit_is_reported_as_llm_error(mock_diff, mock_model):
+    GEMINI.breaker.state = CircuitBreaker.OPEN
+    GEMINI.breaker.opened_at = GEMINI.breaker.clock()
+
+    result = detect_changes(make_scan("a"), make_scan("b"), "PROMPT", "KEY")
+
+    assert result.startswith("Dependency unavailable")
+    mock_model.return_value.generate_content.assert_not_called()
+
+
+@patch("app.main.smtplib.SMTP_SSL")
+def test_send_email_uses_timeout(mock_smtp):
+    send_email("user@example.com", "subject", "<p>body</p>")
+    assert mock_smtp.call_args.kwargs["timeout"] == SMTP.timeout
+    mock_smtp.return_value.__enter__.return_value.sendmail.assert_called_once()
+
+
+def test_open_breaker_fails_fast_even_with_full_bulkhead():
+    clock = FakeClock()
+    dep = Dependency("fake", timeout=60, max_concurrent=1, failure_threshold=1, reset_timeout=30,
+                     clock=clock, bulkhead_wait=5)
+    service = FlakyService()
+    service.fail = False
+
+    worker = threading.Thread(target=dep.call, args=(service.hang,))
+    worker.start()
+    try:
+        assert service.started.wait(5)
+        dep.breaker.record_failure(requests.Timeout("hung"))
+
+        started = time.monotonic()
+        with pytest.raises(CircuitOpenError):
+            dep.call(lambda: "never")
+        assert time.monotonic() - started < 0.5
+    finally:
+        service.release.set()
+        worker.join()
+
+
+@patch("app.main.genai.GenerativeModel")
+@patch("app.main.requests.get")
+def test_missing_commit_is_not_retryable(mock_get, mock_model):
+    mock_get.return_value = type("Resp", (), {"status_code": 404, "text": ""})
+
+    result = detect_changes(make_scan("a"), make_scan("b"), "PROMPT", "KEY")
+
+    assert result.startswith("Comparison failed")
+    assert GITHUB.breaker.failures == 0
+
+
+@patch("app.main.genai.GenerativeModel")
+@patch("app.main.requests.get")
+def test_github_server_error_is_retryable(mock_get, mock_model):
+    mock_get.return_value = type("Resp", (), {"status_code": 502, "text": ""})
+
+    result = detect_changes(make_scan("a"), make_scan("b"), "PROMPT", "KEY")
+
+    assert result.startswith("Gemini LLM error")
+    assert GITHUB.breaker.failures == 1
+
+
+@pytest.mark.parametrize("status_code, headers", [
+    (429, {}),
+    (403, {"X-RateLimit-Remaining": "0"}),
+])
+@patch("app.main.genai.GenerativeModel")
+@patch("app.main.requests.get")
+def test_github_rate_limit_is_retryable(mock_get, mock_model, status_code, headers):
+    mock_get.return_value = type("Resp", (), {"status_code": status_code, "text": "", "headers": headers})
+
+    result = detect_changes(make_scan("a"), make_scan("b"), "PROMPT", "KEY")
+
+    assert result.startswith("Gemini LLM error")
+    assert "rate limited" in result
+    assert GITHUB.breaker.failures == 1
+
+
+@patch("app.main.genai.GenerativeModel")
+@patch("app.main.requests.get")
+def test_github_forbidden_without_rate_limit_is_not_retryable(mock_get, mock_model):
+    mock_get.return_value = type("Resp", (), {
+        "status_code": 403, "text": "", "headers": {"X-RateLimit-Remaining": "4999"}
+    })
+
+    result = detect_changes(make_scan("a"), make_scan("b"), "PROMPT", "KEY")
+
+    assert result.startswith("Comparison failed")
+
+
+@patch("app.main.send_email")
+def test_store_scan_only_defers_transient_failures(mock_send, app_db):
+    db = app_db()
+    db.add(ScanDetails(repo_url="https://github.com/a/repo", name="repo", commit="abc", tag_name="v1", data="[]"))
+    db.add(Subscription(project_name="repo", email="user@example.com", endpoints="[]"))
+    db.commit()
+
+    payload = {"repo_url": "https://github.com/a/repo", "tag_name": "v1", "data": []}
+    with patch("app.main.detect_changes", return_value="Comparison failed: Commit def does not exist on GitHub."):
+        client.post("/api/scan", json={**payload, "commit": "def"})
+    with patch("app.main.detect_changes", return_value="Gemini LLM error: circuit open"):
+        client.post("/api/scan", json={**payload, "commit": "ghi"})
+
+    pending = db.query(PendingNotification).all()
+    assert [(p.head_scan_id, p.email) for p in pending] == [
+        (db.query(ScanDetails).filter(ScanDetails.commit == "ghi").one().id, "user@example.com")
+    ]
+    failed_scan = db.query(ScanDetails).filter(ScanDetails.commit == "def").one()
+    assert failed_scan.report.startswith("Comparison failed")
+    mock_send.assert_not_called()
+    db.close()
+
+
+def test_permanent_errors_do_not_open_breaker():
+    dep = Dependency("fake", timeout=1, max_concurrent=1, failure_threshold=2,
+                     failure_types=(requests.Timeout,))
+
+    def bad_input():
+        raise ValueError("prompt too large")
+
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            dep.call(bad_input)
+
+    assert dep.breaker.state == CircuitBreaker.CLOSED
+    assert dep.breaker.failures == 0
+
+
+@patch("app.main.smtplib.SMTP_SSL")
+def test_refused_recipient_does_not_open_smtp_breaker(mock_smtp):
+    server = mock_smtp.return_value.__enter__.return_value
+    server.sendmail.side_effect = smtplib.SMTPRecipientsRefused({"bad@example.com": (550, b"no such user")})
+
+    for _ in range(SMTP.breaker.failure_threshold + 1):
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            send_email("bad@example.com", "subject", "<p>body</p>")
+
+    assert SMTP.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,63 @@
+import json
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app, ScanDetails
+
+client = TestClient(app)
+
+
+def seed(session_factory):
+    db = session_factory()
+    db.add(ScanDetails(
+        repo_url="https://github.com/a/repo", name="repo", commit="abc123", tag_name="v1",
+        data=json.dumps([{"method": "GET", "path": f"/items/{i}"} for i in range(50)])
+    ))
+    db.commit()
+    db.close()
+
+
+def test_etag_and_not_modified(app_db):
+    seed(app_db)
+    first = client.get("/api/projects")
+    etag = first.headers["etag"]
+    again = client.get("/api/projects", headers={"If-None-Match": etag})
+    other = client.get("/api/projects", headers={"If-None-Match": '"stale"'})
+
+    assert first.status_code == 200
+    assert first.json() == {"projects": [{"name": "repo", "url": "https://github.com/a/repo"}]}
+    assert again.status_code == 304
+    assert again.content == b""
+    assert other.status_code == 200
+    assert other.headers["etag"] == etag
+
+
+def test_large_responses_are_gzipped(app_db):
+    seed(app_db)
+    response = client.get("/api/projects/repo", headers={"Accept-Encoding": "gzip"})
+    plain = client.get("/api/projects/repo", headers={"Accept-Encoding": "identity"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()["scans"][0]["data"]) == 50
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"] != response.headers["etag"]
+
+
+@patch("app.main.detect_changes", return_value="false <p>No changes</p>")
+def test_writes_invalidate_cache(mock_llm, app_db):
+    seed(app_db)
+    subs_etag = client.get("/api/subscriptions").headers["etag"]
+    details_etag = client.get("/api/projects/repo").headers["etag"]
+
+    client.post("/api/subscribe", json={"name": "repo", "mail": "user@example.com", "endpoints": []})
+    subs = client.get("/api/subscriptions", headers={"If-None-Match": subs_etag})
+
+    client.post("/api/scan", json={
+        "repo_url": "https://github.com/a/repo", "commit": "def456", "tag_name": "v2",
+        "data": [{"method": "GET", "path": "/x"}]
+    })
+    details = client.get("/api/projects/repo", headers={"If-None-Match": details_etag})
+
+    assert subs.status_code == 200
+    assert len(subs.json()["subscriptions"]) == 1
+    assert details.status_code == 200
+    assert len(details.json()["scans"]) == 2
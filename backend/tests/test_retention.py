@@ -0,0 +1,87 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+from app.main import ScanDetails, PendingNotification, scan_content_hash
+from app.retention import select_expired, compact_scans
+
+NOW = datetime(2026, 6, 1)
+
+
+def make_scan(id, days_old, endpoints, tag_name="v1", report=None):
+    return ScanDetails(
+        id=id,
+        name="repo",
+        repo_url="https://github.com/a/repo",
+        commit=f"c{id}",
+        tag_name=tag_name,
+        report=report,
+        data=json.dumps([{"method": "GET", "path": p} for p in endpoints]),
+        created_at=NOW - timedelta(days=days_old),
+    )
+
+
+def test_select_expired_keeps_changed_tagged_and_recent_scans():
+    scans = [
+        make_scan(1, 90, ["/a"]),                     # first scan
+        make_scan(2, 80, ["/a"]),                     # unchanged -> dropped
+        make_scan(3, 70, ["/a", "/b"]),               # data changed
+        make_scan(4, 60, ["/a", "/b"], tag_name="v2"),  # first scan of a new tag
+        make_scan(5, 50, ["/a", "/b"], tag_name="v2", report="true <p>x</p>"),
+        make_scan(6, 45, ["/a", "/b"], tag_name="v2"),  # protected by queued notification
+        make_scan(7, 40, ["/a", "/b"], tag_name="v2"),  # unchanged -> dropped
+        make_scan(8, 5, ["/a", "/b"], tag_name="v2"),   # recent
+    ]
+
+    expired = select_expired(scans, NOW - timedelta(days=30), protected_ids={6})
+
+    assert [s.id for s in expired] == [2, 7]
+
+
+def test_select_expired_drops_unchanged_scans_sharing_a_tag():
+    # the analyzer always sends a tag, so a repeated tag must not pin every scan
+    scans = [make_scan(i, 100 - i, ["/a"], tag_name="main") for i in range(1, 6)]
+
+    expired = select_expired(scans, NOW - timedelta(days=30))
+
+    assert [s.id for s in expired] == [2, 3, 4]
+
+
+def test_select_expired_never_drops_latest_scan():
+    scans = [make_scan(1, 90, ["/a"]), make_scan(2, 80, ["/a"])]
+    assert select_expired(scans, NOW - timedelta(days=30)) == []
+
+
+def test_compact_scans_archives_and_deletes(db, tmp_path):
+    for scan in [make_scan(1, 90, ["/a"]), make_scan(2, 80, ["/a"]), make_scan(3, 70, ["/a"])]:
+        db.add(scan)
+    db.add(PendingNotification(email="u@example.com", base_scan_id=1, head_scan_id=2,
+                               sent_at=NOW - timedelta(days=60)))
+    db.commit()
+
+    removed = compact_scans(db, 30, archive_path=tmp_path / "archive", now=NOW)
+
+    assert removed == 1
+    assert [s.id for s in db.query(ScanDetails).order_by(ScanDetails.id)] == [1, 3]
+    assert db.query(PendingNotification).count() == 0
+
+    archive = tmp_path / "archive" / "repo" / "scans-20260601.jsonl.gz"
+    with gzip.open(archive, "rt") as f:
+        rows = [json.loads(line) for line in f]
+    assert [row["id"] for row in rows] == [2]
+    assert rows[0]["data"] == [{"method": "GET", "path": "/a"}]
+
+
+def test_compact_scans_compares_content_hashes(db):
+    data = [{"method": "GET", "path": "/a"}]
+    legacy = make_scan(1, 90, ["/a"])                 # stored before hashes existed
+    hashed = [make_scan(i, 90 - i, ["/a"]) for i in (2, 3)]
+    for scan in hashed:
+        scan.content_hash = scan_content_hash(data)
+        scan.data = "not parsed when a hash is stored"
+    db.add_all([legacy, *hashed])
+    db.commit()
+
+    removed = compact_scans(db, 30, now=NOW)
+
+    assert removed == 1
+    assert [s.id for s in db.query(ScanDetails).order_by(ScanDetails.id)] == [1, 3]
@@ -0,0 +1,119 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app, run_digests, ScanDetails, Subscription
+
+client = TestClient(app)
+
+PAYLOAD = {
+    "repo_url": "https://github.com/test/repo",
+    "commit": "def456",
+    "tag_name": "v2",
+    "data": [{"method": "GET", "path": "/x"}, {"method": "POST", "path": "/y"}]
+}
+
+
+def seed(session_factory):
+    db = session_factory()
+    db.add(ScanDetails(repo_url=PAYLOAD["repo_url"], name="repo", commit="abc123", tag_name="v1", data="[]"))
+    db.add(Subscription(project_name="repo", email="user@example.com", endpoints="[]"))
+    db.commit()
+    db.close()
+
+
+def slow_llm(*args):
+    time.sleep(0.2)
+    return "true <p>Changed</p>"
+
+
+@patch("app.main.send_email")
+@patch("app.main.detect_changes", side_effect=slow_llm)
+def test_concurrent_duplicate_scans_call_llm_once(mock_llm, mock_send, app_db):
+    seed(app_db)
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        responses = list(pool.map(lambda _: client.post("/api/scan", json=PAYLOAD), range(5)))
+
+    assert all(r.status_code == 200 for r in responses)
+    duplicates = [r.json() for r in responses if r.json() != "ok"]
+    assert len(duplicates) == 4
+    assert all(d["report"] == "true <p>Changed</p>" for d in duplicates)
+    assert mock_llm.call_count == 1
+    assert mock_send.call_count == 1
+
+    db = app_db()
+    assert db.query(ScanDetails).count() == 2
+    db.close()
+
+
+@patch("app.main.send_email")
+@patch("app.main.detect_changes", return_value="false <p>No changes</p>")
+def test_idempotency_key(mock_llm, mock_send, app_db):
+    seed(app_db)
+    first = client.post("/api/scan", json=PAYLOAD, headers={"Idempotency-Key": "run-1"})
+    again = client.post("/api/scan", json=PAYLOAD, headers={"Idempotency-Key": "run-1"})
+    reused = client.post(
+        "/api/scan", json={**PAYLOAD, "commit": "zzz999"}, headers={"Idempotency-Key": "run-1"}
+    )
+
+    assert first.json() == "ok"
+    assert again.json()["status"] == "duplicate"
+    assert again.json()["scan"]["commit"] == "def456"
+    assert reused.status_code == 409
+    assert mock_llm.call_count == 1
+
+
+@patch("app.main.send_email")
+@patch("app.main.detect_changes", side_effect=lambda *args: time.sleep(0.5) or "false <p>No changes</p>")
+def test_unrelated_scan_does_not_wait_behind_llm_call(mock_llm, mock_send, app_db):
+    seed(app_db)
+    other = {**PAYLOAD, "repo_url": "https://github.com/test/other"}
+
+    # one stripe, so both scans share a lock
+    with patch("app.main.INGEST_LOCKS", [threading.Lock()]), ThreadPoolExecutor(max_workers=2) as pool:
+        slow = pool.submit(client.post, "/api/scan", json=PAYLOAD)
+        time.sleep(0.1)
+        started = time.monotonic()
+        fast = client.post("/api/scan", json=other)
+        elapsed = time.monotonic() - started
+        slow.result()
+
+    assert fast.json() == "ok"
+    assert elapsed < 0.3
+
+
+@patch("app.main.detect_changes")
+def test_duplicate_without_subscribers_reports_not_computed(mock_llm, app_db):
+    db = app_db()
+    db.add(ScanDetails(repo_url=PAYLOAD["repo_url"], name="repo", commit="abc123", tag_name="v1", data="[]"))
+    db.commit()
+    db.close()
+
+    assert client.post("/api/scan", json=PAYLOAD).json() == "ok"
+    again = client.post("/api/scan", json=PAYLOAD).json()
+
+    assert again["status"] == "duplicate"
+    assert again["report"] is None
+    assert again["report_status"] == "not_computed"
+    mock_llm.assert_not_called()
+
+
+@patch("app.main.send_email")
+@patch("app.main.detect_changes", return_value="true <p>Changed</p>")
+def test_digest_stores_report_for_later_duplicates(mock_llm, mock_send, app_db):
+    db = app_db()
+    db.add(ScanDetails(repo_url=PAYLOAD["repo_url"], name="repo", commit="abc123", tag_name="v1", data="[]"))
+    db.add(Subscription(project_name="repo", email="user@example.com", endpoints="[]", delivery_mode="hourly"))
+    db.commit()
+
+    client.post("/api/scan", json=PAYLOAD)
+    assert client.post("/api/scan", json=PAYLOAD).json()["report_status"] == "deferred"
+
+    run_digests(db, "hourly")
+    again = client.post("/api/scan", json=PAYLOAD).json()
+    db.close()
+
+    assert again["report_status"] == "stored"
+    assert again["report"] == "true <p>Changed</p>"
+    assert mock_llm.call_count == 1